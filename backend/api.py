@@ -1,19 +1,37 @@
-from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, status, File, UploadFile, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel
-from typing import List, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from pydantic import AliasChoices, BaseModel, BeforeValidator, Field
+from typing import Annotated, List, Optional
 from datetime import datetime, timedelta
 import os
+import logging
+import re
 import sys
+import hashlib
+import secrets
+import time
+import asyncio
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from cachetools import TTLCache
 from jose import jwt, JWTError
-from passlib.context import CryptContext
+import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from bson import ObjectId
+from bson.regex import Regex
+from bson.errors import InvalidId
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from backend.imgbb import upload_image_to_imgbb
 
@@ -21,14 +39,35 @@ from backend.imgbb import upload_image_to_imgbb
 SECRET_KEY = os.getenv("SECRET_KEY", "devitappsecretkeyforauthentication123")  
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  
+RESET_CODE_EXPIRE_SECONDS = 60 * 60
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(time_cost=3, memory_cost=64 * 1024, parallelism=4)
+# Each Argon2 hash holds 64 MiB, so cap concurrent hashes per worker process
+_hash_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="password-hash")
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 
+_auth_cache = TTLCache(maxsize=10_000, ttl=30)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the outbound HTTP pool on startup, release every pool on shutdown"""
+    app.state.http = httpx.AsyncClient(
+        timeout=15,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+    )
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+        client.close()
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+
+
 app = FastAPI(
     title="DevIT API",
     description="Reddit-like social media API for the DevIT application",
@@ -36,6 +75,7 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json",
+    lifespan=lifespan,
     openapi_tags=[
         {"name": "auth", "description": "Authentication operations"},
         {"name": "posts", "description": "Operations related to posts"},
@@ -46,23 +86,93 @@ app = FastAPI(
 )
 
 
+FRONTEND_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("FRONTEND_ORIGINS", "http://localhost:8081").split(",")
+    if origin.strip()
+]
+
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  
+    allow_origins=FRONTEND_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
 
 
 env = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 MONGODB_URL = env
-client = AsyncIOMotorClient(MONGODB_URL)
+# Pool sizes are per worker process, so the server sees up to WEB_CONCURRENCY * MONGO_MAX_POOL connections
+MONGO_MIN_POOL = int(os.getenv("MONGO_MIN_POOL", "2"))
+MONGO_MAX_POOL = int(os.getenv("MONGO_MAX_POOL", "20"))
+client = AsyncIOMotorClient(
+    MONGODB_URL,
+    maxPoolSize=MONGO_MAX_POOL,
+    minPoolSize=MONGO_MIN_POOL,
+    maxIdleTimeMS=60000,
+    serverSelectionTimeoutMS=5000,
+    connectTimeoutMS=5000,
+    socketTimeoutMS=30000,
+    retryWrites=True,
+    compressors="zlib"
+)
 database = client.devit_db
 posts_collection = database.posts
 comments_collection = database.comments
 users_collection = database.users
+votes_collection = database.votes
+
+
+_POST_PROJECTION = {
+    "title": 1,
+    "content": 1,
+    "author": 1,
+    "user_id": 1,
+    "upvotes": 1,
+    "downvotes": 1,
+    "imageUrl": 1,
+    "comments_count": 1
+}
+_COMMENT_PROJECTION = {
+    "post_id": 1,
+    "text": 1,
+    "username": 1,
+    "user_id": 1,
+    "upvotes": 1,
+    "downvotes": 1,
+    "created_at": 1
+}
+_SORT_OPTIONS = {
+    "newest": {"created_at": -1},
+    "oldest": {"created_at": 1},
+    "most_upvoted": {"upvotes": -1, "created_at": -1},
+    "most_downvoted": {"downvotes": -1, "created_at": -1}
+}
+_VOTE_TRANSITIONS = {
+    (0, "upvote"): {"upvotes": 1},
+    (-1, "upvote"): {"upvotes": 1, "downvotes": -1},
+    (0, "downvote"): {"downvotes": 1},
+    (1, "downvote"): {"upvotes": -1, "downvotes": 1},
+    (1, "remove_upvote"): {"upvotes": -1},
+    (-1, "remove_downvote"): {"downvotes": -1}
+}
+_VOTE_NO_OP_MESSAGES = {
+    "upvote": "Already upvoted",
+    "downvote": "Already downvoted",
+    "remove_upvote": "Not upvoted",
+    "remove_downvote": "Not downvoted"
+}
+_CAST_VOTE_VALUES = {"upvote": 1, "downvote": -1}
+_REMOVED_VOTE_VALUES = {"remove_upvote": 1, "remove_downvote": -1}
+_USER_PROJECTION = {"password": 0, "refresh_token": 0, "reset_code": 0, "reset_code_expiry": 0}
+_CREDENTIALS_PROJECTION = {"username": 1, "password": 1}
+
+
+ObjectIdStr = Annotated[str, BeforeValidator(str)]
 
 
 class PostCreate(BaseModel):
@@ -103,11 +213,11 @@ class PostUpdateForm:
         self.remove_image = remove_image
 
 class PostResponse(BaseModel):
-    id: str
+    id: ObjectIdStr = Field(validation_alias=AliasChoices("_id", "id"))
     title: str
     content: str
     author: str
-    user_id: Optional[str] = None
+    user_id: Optional[str] = ""
     upvotes: int
     downvotes: int
     imageUrl: Optional[str] = None
@@ -123,8 +233,8 @@ class CommentCreate(BaseModel):
     user_id: Optional[str] = None
 
 class CommentResponse(BaseModel):
-    id: str
-    post_id: str
+    id: ObjectIdStr = Field(validation_alias=AliasChoices("_id", "id"))
+    post_id: ObjectIdStr
     text: str
     username: str
     user_id: Optional[str] = None
@@ -132,6 +242,14 @@ class CommentResponse(BaseModel):
     downvotes: int
     created_at: datetime
 
+class PostVoteResponse(PostResponse):
+    message: Optional[str] = None
+    action: Optional[str] = None
+
+class CommentVoteResponse(CommentResponse):
+    message: Optional[str] = None
+    action: Optional[str] = None
+
 class UserCreate(BaseModel):
     username: str
     email: str
@@ -173,41 +291,33 @@ class TokenData(BaseModel):
     username: Optional[str] = None
 
 
-def post_helper(post) -> dict:
+def parse_object_id(value: str, detail: str) -> ObjectId:
+    """Parse a Mongo ObjectId, rejecting malformed IDs with a 400"""
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail=detail)
+
+def post_object_id(post_id: str) -> ObjectId:
+    """Resolve the post_id path parameter to an ObjectId"""
+    return parse_object_id(post_id, "Invalid post ID")
+
+def comment_object_id(comment_id: str) -> ObjectId:
+    """Resolve the comment_id path parameter to an ObjectId"""
+    return parse_object_id(comment_id, "Invalid comment ID")
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """Return the app-wide pooled HTTP client"""
+    return request.app.state.http
+
+
+def post_helper(post) -> PostResponse:
     
-    return {
-        "id": str(post["_id"]),
-        "title": post["title"],
-        "content": post["content"],
-        "author": post["author"],
-        "user_id": post.get("user_id", ""),
-        "upvotes": post["upvotes"],
-        "downvotes": post["downvotes"],
-        "imageUrl": post.get("imageUrl"),
-        "comments_count": post.get("comments_count", 0),
-        "voters": post.get("voters", {"upvoters": [], "downvoters": []})
-    }
+    return PostResponse.model_validate(post)
 
-def comment_helper(comment) -> dict:
+def comment_helper(comment) -> CommentResponse:
     
-    created_at = comment["created_at"]
-    if isinstance(created_at, datetime):
-        created_at_iso = created_at.isoformat()
-    else:
-        
-        created_at_iso = created_at
-        
-    return {
-        "id": str(comment["_id"]),
-        "post_id": str(comment["post_id"]),
-        "text": comment["text"],
-        "username": comment["username"],
-        "user_id": comment.get("user_id"),
-        "upvotes": comment["upvotes"],
-        "downvotes": comment["downvotes"],
-        "created_at": created_at_iso,
-        "voters": comment.get("voters", {"upvoters": [], "downvoters": []})
-    }
+    return CommentResponse.model_validate(comment)
     
 def user_helper(user) -> dict:
     return {
@@ -220,25 +330,151 @@ def user_helper(user) -> dict:
     }
 
 
-def verify_password(plain_password, hashed_password):
+def _verify_password(plain_password, hashed_password):
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    if hashed_password.startswith("$2"):
+        try:
+            return bcrypt.checkpw(plain_password.encode()[:72], hashed_password.encode())
+        except ValueError:
+            return False
+    
+    try:
+        return password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+async def verify_password(plain_password, hashed_password):
+    """Verify a password against its hash without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(
+        _hash_pool, _verify_password, plain_password, hashed_password
+    )
 
-def get_password_hash(password):
-    """Hash a password for storage"""
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    """Hash a password for storage without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(
+        _hash_pool, password_hasher.hash, password
+    )
+
+def password_needs_rehash(hashed_password):
+    """Check whether a stored hash is legacy bcrypt or uses outdated Argon2 parameters"""
+    return hashed_password.startswith("$2") or password_hasher.check_needs_rehash(hashed_password)
+
+async def upgrade_password_hash(user: dict, plain_password: str):
+    """Rehash a verified password with the current Argon2 parameters if needed"""
+    if password_needs_rehash(user["password"]):
+        await users_collection.update_one(
+            {"_id": user["_id"]},
+            {"$set": {"password": await get_password_hash(plain_password)}}
+        )
 
-async def get_user_by_email(email: str):
+def hash_refresh_token(refresh_token):
+    """Hash a refresh token for storage"""
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+async def get_user_by_email(email: str, projection: Optional[dict] = None):
     """Get user by email"""
-    return await users_collection.find_one({"email": email})
+    return await users_collection.find_one({"email": email}, projection=projection)
+
+async def ensure_user_is_new(user: UserCreate):
+    """Reject a signup whose username or email is already taken"""
+    existing = await users_collection.find(
+        {"$or": [{"username": user.username}, {"email": user.email}]},
+        projection={"username": 1}
+    ).to_list(length=2)
+    if any(match["username"] == user.username for match in existing):
+        raise HTTPException(status_code=400, detail="Username already exists")
+    if existing:
+        raise HTTPException(status_code=400, detail="Email already in use")
+
+async def insert_new_user(user_dict: dict):
+    """Insert a new user, reporting a signup that lost a race with the same 400 as ensure_user_is_new"""
+    try:
+        result = await users_collection.insert_one(user_dict)
+    except DuplicateKeyError as e:
+        if "username" in (e.details or {}).get("keyPattern", {}):
+            raise HTTPException(status_code=400, detail="Username already exists")
+        raise HTTPException(status_code=400, detail="Email already in use")
+    user_dict["_id"] = result.inserted_id
+
+async def swap_vote(target_id: ObjectId, user_id: str, vote_type: str) -> int:
+    """Apply vote_type to a user's vote in one atomic write and return the vote it replaced: 1, -1, or 0 for none"""
+    vote_key = {"target_id": target_id, "user_id": user_id}
+    
+    if vote_type in _REMOVED_VOTE_VALUES:
+        removed = _REMOVED_VOTE_VALUES[vote_type]
+        previous = await votes_collection.find_one_and_delete({**vote_key, "value": removed}, projection={"_id": 1})
+        return removed if previous else 0
+    
+    previous = await votes_collection.find_one_and_update(
+        vote_key,
+        {"$set": {"value": _CAST_VOTE_VALUES[vote_type]}},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+        projection={"value": 1}
+    )
+    return previous["value"] if previous else 0
+
+async def apply_vote(collection, helper, projection, not_found_detail, object_id: ObjectId, user_id: str, vote_type: str):
+    """Apply a vote to a post or comment and return the updated document"""
+    if vote_type not in _VOTE_NO_OP_MESSAGES:
+        raise HTTPException(status_code=400, detail="Invalid vote type")
+    
+    increment = _VOTE_TRANSITIONS.get((await swap_vote(object_id, user_id, vote_type), vote_type))
+    if increment is None:
+        target = await collection.find_one({"_id": object_id}, projection=projection)
+        if not target:
+            await votes_collection.delete_one({"target_id": object_id, "user_id": user_id})
+            raise HTTPException(status_code=404, detail=not_found_detail)
+        return {
+            **helper(target).model_dump(),
+            "message": _VOTE_NO_OP_MESSAGES[vote_type],
+            "action": "none"
+        }
+    
+    updated = await collection.find_one_and_update(
+        {"_id": object_id},
+        {"$inc": increment},
+        return_document=ReturnDocument.AFTER,
+        projection=projection
+    )
+    if not updated:
+        # The target is gone, so drop the vote rather than leave it orphaned
+        await votes_collection.delete_one({"target_id": object_id, "user_id": user_id})
+        raise HTTPException(status_code=404, detail=not_found_detail)
+    return helper(updated)
+
+async def raise_post_access_error(object_id: ObjectId, forbidden_detail: str):
+    """Raise 404 if the post does not exist, otherwise 403"""
+    post = await posts_collection.find_one({"_id": object_id}, projection={"_id": 1})
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=forbidden_detail)
+
+async def update_own_post(object_id: ObjectId, user_id: str, update_dict: dict):
+    """Apply an update to a post owned by user_id and return the updated post"""
+    owner_filter = {"_id": object_id, "user_id": user_id}
+    if update_dict:
+        post = await posts_collection.find_one_and_update(
+            owner_filter,
+            {"$set": update_dict},
+            return_document=ReturnDocument.AFTER,
+            projection=_POST_PROJECTION
+        )
+    else:
+        post = await posts_collection.find_one(owner_filter, projection=_POST_PROJECTION)
+    
+    if not post:
+        await raise_post_access_error(object_id, "You can only edit your own posts")
+    return post
 
 async def authenticate_user(email: str, password: str):
     """Authenticate a user by email and password"""
-    user = await get_user_by_email(email)
+    user = await get_user_by_email(email, projection=_CREDENTIALS_PROJECTION)
     if not user:
         return False
-    if not verify_password(password, user["password"]):
+    if not await verify_password(password, user["password"]):
         return False
+    await upgrade_password_hash(user, password)
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -252,6 +488,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def auth_cache_key(token: str) -> bytes:
+    """Key the authenticated-user cache by a digest rather than the raw token"""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+def _decode_token(token: str):
+    """Decode a JWT into its subject and expiry"""
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require_exp": True})
+    return payload.get("sub"), payload["exp"]
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """Get the current authenticated user from the token"""
     credentials_exception = HTTPException(
@@ -259,18 +504,33 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    
+    cache_key = auth_cache_key(token)
+    cached = _auth_cache.get(cache_key)
+    if cached is not None:
+        user, exp = cached
+        if time.time() > exp:
+            _auth_cache.pop(cache_key, None)
+            raise credentials_exception
+        return user
+    
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+        user_id, exp = _decode_token(token)
+        if user_id is None or time.time() > exp:
             raise credentials_exception
         token_data = TokenData(user_id=user_id)
     except JWTError:
         raise credentials_exception
     
-    user = await users_collection.find_one({"_id": ObjectId(token_data.user_id)})
+    user = await users_collection.find_one(
+        {"_id": ObjectId(token_data.user_id)},
+        projection=_USER_PROJECTION
+    )
     if user is None:
         raise credentials_exception
+    
+    user["_id_str"] = str(user["_id"])
+    _auth_cache[cache_key] = (user, exp)
     return user
 
 @app.get("/", tags=["health"])
@@ -290,9 +550,12 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     
     user = None
     if "@" in form_data.username:
-        user = await get_user_by_email(form_data.username)
+        user = await get_user_by_email(form_data.username, projection=_CREDENTIALS_PROJECTION)
     else:
-        user = await users_collection.find_one({"username": form_data.username})
+        user = await users_collection.find_one(
+            {"username": form_data.username},
+            projection=_CREDENTIALS_PROJECTION
+        )
     
     if not user:
         raise HTTPException(
@@ -301,37 +564,39 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not verify_password(form_data.password, user["password"]):
+    if not await verify_password(form_data.password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    await upgrade_password_hash(user, form_data.password)
     
     
+    user_id = str(user["_id"])
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user["_id"])},
+        data={"sub": user_id},
         expires_delta=access_token_expires
     )
     
     
     refresh_token_expires = timedelta(days=30)  
     refresh_token = create_access_token(
-        data={"sub": str(user["_id"]), "refresh": True},
+        data={"sub": user_id, "refresh": True},
         expires_delta=refresh_token_expires
     )
     
     
     await users_collection.update_one(
         {"_id": user["_id"]},
-        {"$set": {"refresh_token": get_password_hash(refresh_token)}}
+        {"$set": {"refresh_token": hash_refresh_token(refresh_token)}}
     )
     
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "user_id": str(user["_id"]),
+        "user_id": user_id,
         "username": user["username"],
         "refresh_token": refresh_token
     }
@@ -349,29 +614,30 @@ async def login_with_email(user_data: UserLogin):
         )
     
     
+    user_id = str(user["_id"])
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user["_id"])},
+        data={"sub": user_id},
         expires_delta=access_token_expires
     )
     
     
     refresh_token_expires = timedelta(days=30)  
     refresh_token = create_access_token(
-        data={"sub": str(user["_id"]), "refresh": True},
+        data={"sub": user_id, "refresh": True},
         expires_delta=refresh_token_expires
     )
     
     
     await users_collection.update_one(
         {"_id": user["_id"]},
-        {"$set": {"refresh_token": get_password_hash(refresh_token)}}
+        {"$set": {"refresh_token": hash_refresh_token(refresh_token)}}
     )
     
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "user_id": str(user["_id"]),
+        "user_id": user_id,
         "username": user["username"],
         "refresh_token": refresh_token
     }
@@ -381,43 +647,23 @@ async def login_with_email(user_data: UserLogin):
 async def get_posts(skip: int = 0, limit: int = 10, sort: str = "newest"):
     """Get all posts with optional sorting"""
     
-    sort_options = {
-        "newest": [("created_at", -1)],
-        "oldest": [("created_at", 1)],
-        "most_upvoted": [("upvotes", -1), ("created_at", -1)],
-        "most_downvoted": [("downvotes", -1), ("created_at", -1)]
-    }
-    
+    sort_option = _SORT_OPTIONS.get(sort) or _SORT_OPTIONS["newest"]
     
-    sort_option = sort_options.get(sort, sort_options["newest"])
+    cursor = posts_collection.find(projection=_POST_PROJECTION).sort(sort_option).skip(skip).limit(limit)
     
     posts = []
-    cursor = posts_collection.find().sort(sort_option).skip(skip).limit(limit)
-    
     async for post in cursor:
-        
-        comment_count = await comments_collection.count_documents({"post_id": post["_id"]})
-        post["comments_count"] = comment_count
         posts.append(post_helper(post))
     
     return posts
 
 @app.get("/posts/{post_id}", response_model=PostResponse, tags=["posts"])
-async def get_post(post_id: str):
+async def get_post(object_id: ObjectId = Depends(post_object_id)):
     """Get a specific post by ID"""
-    try:
-        object_id = ObjectId(post_id)
-    except:
-        raise HTTPException(status_code=400, detail="Invalid post ID")
-    
-    post = await posts_collection.find_one({"_id": object_id})
+    post = await posts_collection.find_one({"_id": object_id}, projection=_POST_PROJECTION)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    
-    comment_count = await comments_collection.count_documents({"post_id": object_id})
-    post["comments_count"] = comment_count
-    
     return post_helper(post)
 
 @app.post("/posts", response_model=PostResponse, tags=["posts"])
@@ -427,21 +673,23 @@ async def create_post(post: PostCreate, current_user: dict = Depends(get_current
         "title": post.title,
         "content": post.content,
         "author": post.author if post.author else current_user["username"],
-        "user_id": str(current_user["_id"]),
+        "user_id": current_user["_id_str"],
         "imageUrl": post.imageUrl,
         "upvotes": 0,
         "downvotes": 0,
+        "comments_count": 0,
         "created_at": datetime.utcnow()
     }
     
     result = await posts_collection.insert_one(post_dict)
-    new_post = await posts_collection.find_one({"_id": result.inserted_id})
-    return post_helper(new_post)
+    post_dict["_id"] = result.inserted_id
+    return post_helper(post_dict)
 
 @app.post("/posts/with-image", response_model=PostResponse, tags=["posts"])
 async def create_post_with_image(
     post_data: PostCreateForm = Depends(),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
 ):
     """Create a new post with an uploaded image"""
     image_url = None
@@ -453,15 +701,15 @@ async def create_post_with_image(
             image_bytes = await post_data.image.read()
             
             
-            print(f"Received image: {post_data.image.filename}, size: {len(image_bytes)} bytes")
+            logger.info("Received image: %s, size: %d bytes", post_data.image.filename, len(image_bytes))
             
             
-            image_url = upload_image_to_imgbb(image_bytes)
+            image_url = await upload_image_to_imgbb(image_bytes, http_client)
             
             
-            print(f"Image uploaded successfully, URL: {image_url}")
+            logger.info("Image uploaded successfully, URL: %s", image_url)
         except Exception as e:
-            print(f"Image upload failed: {str(e)}")
+            logger.error("Image upload failed: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Image upload failed: {str(e)}"
@@ -471,71 +719,34 @@ async def create_post_with_image(
         "title": post_data.title,
         "content": post_data.content,
         "author": post_data.author if post_data.author else current_user["username"],
-        "user_id": str(current_user["_id"]),
+        "user_id": current_user["_id_str"],
         "imageUrl": image_url,
         "upvotes": 0,
         "downvotes": 0,
+        "comments_count": 0,
         "created_at": datetime.utcnow()
     }
     
     result = await posts_collection.insert_one(post_dict)
-    new_post = await posts_collection.find_one({"_id": result.inserted_id})
-    return post_helper(new_post)
+    post_dict["_id"] = result.inserted_id
+    return post_helper(post_dict)
 
 @app.put("/posts/{post_id}", response_model=PostResponse, tags=["posts"])
-async def update_post(post_id: str, update_data: PostUpdate, current_user: dict = Depends(get_current_user)):
+async def update_post(update_data: PostUpdate, object_id: ObjectId = Depends(post_object_id), current_user: dict = Depends(get_current_user)):
     """Update a post with JSON data - only the author can edit their own posts"""
-    try:
-        object_id = ObjectId(post_id)
-    except:
-        raise HTTPException(status_code=400, detail="Invalid post ID")
-    
-    post = await posts_collection.find_one({"_id": object_id})
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    
-    if post.get("user_id") != str(current_user["_id"]):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only edit your own posts"
-        )
-    
-    
-    update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
-    
-    if update_dict:
-        await posts_collection.update_one(
-            {"_id": object_id},
-            {"$set": update_dict}
-        )
+    update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
     
-    updated_post = await posts_collection.find_one({"_id": object_id})
-    return post_helper(updated_post)
+    return post_helper(await update_own_post(object_id, current_user["_id_str"], update_dict))
 
 @app.put("/posts/{post_id}/form", response_model=PostResponse, tags=["posts"])
 async def update_post_with_image(
-    post_id: str, 
+    object_id: ObjectId = Depends(post_object_id),
     update_data: PostUpdateForm = Depends(),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
 ):
     """Update a post with form data and optional image upload - only the author can edit their own posts"""
-    try:
-        object_id = ObjectId(post_id)
-    except:
-        raise HTTPException(status_code=400, detail="Invalid post ID")
-    
-    post = await posts_collection.find_one({"_id": object_id})
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    
-    if post.get("user_id") != str(current_user["_id"]):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only edit your own posts"
-        )
-    
+    user_id = current_user["_id_str"]
     
     update_dict = {}
     
@@ -547,12 +758,16 @@ async def update_post_with_image(
     
     
     if update_data.image:
+        owned_post = await posts_collection.find_one({"_id": object_id, "user_id": user_id}, projection={"_id": 1})
+        if not owned_post:
+            await raise_post_access_error(object_id, "You can only edit your own posts")
+        
         try:
             
             image_bytes = await update_data.image.read()
             
             
-            image_url = upload_image_to_imgbb(image_bytes)
+            image_url = await upload_image_to_imgbb(image_bytes, http_client)
             update_dict["imageUrl"] = image_url
         except Exception as e:
             raise HTTPException(
@@ -563,30 +778,18 @@ async def update_post_with_image(
         
         update_dict["imageUrl"] = None
     
-    if update_dict:
-        await posts_collection.update_one(
-            {"_id": object_id},
-            {"$set": update_dict}
-        )
-    
-    updated_post = await posts_collection.find_one({"_id": object_id})
-    return post_helper(updated_post)
+    return post_helper(await update_own_post(object_id, user_id, update_dict))
 
 
 @app.delete("/posts/{post_id}", tags=["posts"])
-async def delete_post(post_id: str, current_user: dict = Depends(get_current_user)):
+async def delete_post(object_id: ObjectId = Depends(post_object_id), current_user: dict = Depends(get_current_user)):
     """Delete a post and its comments - only the author can delete their own posts"""
-    try:
-        object_id = ObjectId(post_id)
-    except:
-        raise HTTPException(status_code=400, detail="Invalid post ID")
-    
-    post = await posts_collection.find_one({"_id": object_id})
+    post = await posts_collection.find_one({"_id": object_id}, projection={"user_id": 1})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
     
-    if post.get("user_id") != str(current_user["_id"]):
+    if post.get("user_id") != current_user["_id_str"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You can only delete your own posts"
@@ -596,134 +799,28 @@ async def delete_post(post_id: str, current_user: dict = Depends(get_current_use
     await posts_collection.delete_one({"_id": object_id})
     
     
+    comment_ids = await comments_collection.distinct("_id", {"post_id": object_id})
     await comments_collection.delete_many({"post_id": object_id})
     
+    
+    await votes_collection.delete_many({"target_id": {"$in": [object_id, *comment_ids]}})
+    
     return {"message": "Post and comments deleted successfully"}
 
-@app.post("/posts/{post_id}/vote", tags=["posts"])
-async def vote_post(post_id: str, vote: VoteRequest, current_user: dict = Depends(get_current_user)):
+@app.post("/posts/{post_id}/vote", response_model=PostVoteResponse, tags=["posts"])
+async def vote_post(vote: VoteRequest, object_id: ObjectId = Depends(post_object_id), current_user: dict = Depends(get_current_user)):
     """Vote on a post (upvote, downvote, remove_upvote, or remove_downvote)"""
-    try:
-        object_id = ObjectId(post_id)
-    except:
-        raise HTTPException(status_code=400, detail="Invalid post ID")
-    
-    post = await posts_collection.find_one({"_id": object_id})
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    user_id = str(current_user["_id"])
-    
-    
-    if "voters" not in post:
-        await posts_collection.update_one(
-            {"_id": object_id},
-            {"$set": {"voters": {"upvoters": [], "downvoters": []}}}
-        )
-        post = await posts_collection.find_one({"_id": object_id})
-    
-    voters = post.get("voters", {"upvoters": [], "downvoters": []})
-    upvoters = voters.get("upvoters", [])
-    downvoters = voters.get("downvoters", [])
-    
-    
-    if vote.vote_type == "upvote":
-        
-        if user_id in upvoters:
-            
-            return {
-                **post_helper(post),
-                "message": "Already upvoted",
-                "action": "none"
-            }
-        
-        
-        if user_id in downvoters:
-            update_operation = {
-                "$pull": {"voters.downvoters": user_id},
-                "$push": {"voters.upvoters": user_id},
-                "$inc": {"upvotes": 1, "downvotes": -1}
-            }
-        else:
-            update_operation = {
-                "$push": {"voters.upvoters": user_id},
-                "$inc": {"upvotes": 1}
-            }
-            
-    elif vote.vote_type == "downvote":
-        
-        if user_id in downvoters:
-            
-            return {
-                **post_helper(post),
-                "message": "Already downvoted",
-                "action": "none"
-            }
-        
-        
-        if user_id in upvoters:
-            update_operation = {
-                "$pull": {"voters.upvoters": user_id},
-                "$push": {"voters.downvoters": user_id},
-                "$inc": {"upvotes": -1, "downvotes": 1}
-            }
-        else:
-            update_operation = {
-                "$push": {"voters.downvoters": user_id},
-                "$inc": {"downvotes": 1}
-            }
-            
-    elif vote.vote_type == "remove_upvote":
-        
-        if user_id not in upvoters:
-            
-            return {
-                **post_helper(post),
-                "message": "Not upvoted",
-                "action": "none"
-            }
-        
-        update_operation = {
-            "$pull": {"voters.upvoters": user_id},
-            "$inc": {"upvotes": -1}
-        }
-        
-    elif vote.vote_type == "remove_downvote":
-        
-        if user_id not in downvoters:
-            
-            return {
-                **post_helper(post),
-                "message": "Not downvoted",
-                "action": "none"
-            }
-        
-        update_operation = {
-            "$pull": {"voters.downvoters": user_id},
-            "$inc": {"downvotes": -1}
-        }
-    else:
-        raise HTTPException(status_code=400, detail="Invalid vote type")
-    
-    await posts_collection.update_one(
-        {"_id": object_id},
-        update_operation
+    return await apply_vote(
+        posts_collection, post_helper, _POST_PROJECTION, "Post not found",
+        object_id, current_user["_id_str"], vote.vote_type
     )
-    
-    updated_post = await posts_collection.find_one({"_id": object_id})
-    return post_helper(updated_post)
 
 
-@app.get("/posts/{post_id}/comments", tags=["comments"])
-async def get_comments(post_id: str):
+@app.get("/posts/{post_id}/comments", response_model=List[CommentResponse], tags=["comments"])
+async def get_comments(object_id: ObjectId = Depends(post_object_id)):
     """Get all comments for a post"""
-    try:
-        object_id = ObjectId(post_id)
-    except:
-        raise HTTPException(status_code=400, detail="Invalid post ID")
-    
     comments = []
-    async for comment in comments_collection.find({"post_id": object_id}).sort("created_at", -1):
+    async for comment in comments_collection.find({"post_id": object_id}, projection=_COMMENT_PROJECTION).sort("created_at", -1):
         comments.append(comment_helper(comment))
     
     return comments
@@ -731,13 +828,10 @@ async def get_comments(post_id: str):
 @app.post("/comments", response_model=CommentResponse, tags=["comments"])
 async def create_comment(comment: CommentCreate):
     """Create a new comment"""
-    try:
-        post_id = ObjectId(comment.post_id)
-    except:
-        raise HTTPException(status_code=400, detail="Invalid post ID")
+    post_id = parse_object_id(comment.post_id, "Invalid post ID")
     
     
-    post = await posts_collection.find_one({"_id": post_id})
+    post = await posts_collection.find_one({"_id": post_id}, projection={"_id": 1})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
@@ -752,121 +846,17 @@ async def create_comment(comment: CommentCreate):
     }
     
     result = await comments_collection.insert_one(comment_dict)
-    new_comment = await comments_collection.find_one({"_id": result.inserted_id})
-    return comment_helper(new_comment)
+    comment_dict["_id"] = result.inserted_id
+    await posts_collection.update_one({"_id": post_id}, {"$inc": {"comments_count": 1}})
+    return comment_helper(comment_dict)
 
-@app.post("/comments/{comment_id}/vote", tags=["comments"])
-async def vote_comment(comment_id: str, vote: VoteRequest, current_user: dict = Depends(get_current_user)):
+@app.post("/comments/{comment_id}/vote", response_model=CommentVoteResponse, tags=["comments"])
+async def vote_comment(vote: VoteRequest, object_id: ObjectId = Depends(comment_object_id), current_user: dict = Depends(get_current_user)):
     """Vote on a comment (upvote, downvote, remove_upvote, or remove_downvote)"""
-    try:
-        object_id = ObjectId(comment_id)
-    except:
-        raise HTTPException(status_code=400, detail="Invalid comment ID")
-    
-    comment = await comments_collection.find_one({"_id": object_id})
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    
-    user_id = str(current_user["_id"])
-    
-    
-    if "voters" not in comment:
-        await comments_collection.update_one(
-            {"_id": object_id},
-            {"$set": {"voters": {"upvoters": [], "downvoters": []}}}
-        )
-        comment = await comments_collection.find_one({"_id": object_id})
-    
-    voters = comment.get("voters", {"upvoters": [], "downvoters": []})
-    upvoters = voters.get("upvoters", [])
-    downvoters = voters.get("downvoters", [])
-    
-    
-    if vote.vote_type == "upvote":
-        
-        if user_id in upvoters:
-            
-            return {
-                **comment_helper(comment),
-                "message": "Already upvoted",
-                "action": "none"
-            }
-        
-        
-        if user_id in downvoters:
-            update_operation = {
-                "$pull": {"voters.downvoters": user_id},
-                "$push": {"voters.upvoters": user_id},
-                "$inc": {"upvotes": 1, "downvotes": -1}
-            }
-        else:
-            update_operation = {
-                "$push": {"voters.upvoters": user_id},
-                "$inc": {"upvotes": 1}
-            }
-            
-    elif vote.vote_type == "downvote":
-        
-        if user_id in downvoters:
-            
-            return {
-                **comment_helper(comment),
-                "message": "Already downvoted",
-                "action": "none"
-            }
-        
-        
-        if user_id in upvoters:
-            update_operation = {
-                "$pull": {"voters.upvoters": user_id},
-                "$push": {"voters.downvoters": user_id},
-                "$inc": {"upvotes": -1, "downvotes": 1}
-            }
-        else:
-            update_operation = {
-                "$push": {"voters.downvoters": user_id},
-                "$inc": {"downvotes": 1}
-            }
-            
-    elif vote.vote_type == "remove_upvote":
-        
-        if user_id not in upvoters:
-            
-            return {
-                **comment_helper(comment),
-                "message": "Not upvoted",
-                "action": "none"
-            }
-        
-        update_operation = {
-            "$pull": {"voters.upvoters": user_id},
-            "$inc": {"upvotes": -1}
-        }
-        
-    elif vote.vote_type == "remove_downvote":
-        
-        if user_id not in downvoters:
-            
-            return {
-                **comment_helper(comment),
-                "message": "Not downvoted",
-                "action": "none"
-            }
-        
-        update_operation = {
-            "$pull": {"voters.downvoters": user_id},
-            "$inc": {"downvotes": -1}
-        }
-    else:
-        raise HTTPException(status_code=400, detail="Invalid vote type")
-    
-    await comments_collection.update_one(
-        {"_id": object_id},
-        update_operation
+    return await apply_vote(
+        comments_collection, comment_helper, _COMMENT_PROJECTION, "Comment not found",
+        object_id, current_user["_id_str"], vote.vote_type
     )
-    
-    updated_comment = await comments_collection.find_one({"_id": object_id})
-    return comment_helper(updated_comment)
 
 
 
@@ -874,17 +864,10 @@ async def vote_comment(comment_id: str, vote: VoteRequest, current_user: dict =
 async def create_user(user: UserCreate):
     """Create a new user (sign up)"""
     
-    existing_user = await users_collection.find_one({"username": user.username})
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username already exists")
-    
-    
-    existing_email = await users_collection.find_one({"email": user.email})
-    if existing_email:
-        raise HTTPException(status_code=400, detail="Email already in use")
+    await ensure_user_is_new(user)
     
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     
     user_dict = {
         "username": user.username,
@@ -895,25 +878,17 @@ async def create_user(user: UserCreate):
         "bio": ""
     }
     
-    result = await users_collection.insert_one(user_dict)
-    new_user = await users_collection.find_one({"_id": result.inserted_id})
-    return user_helper(new_user)
+    await insert_new_user(user_dict)
+    return user_helper(user_dict)
 
 @app.post("/register", response_model=Token, tags=["auth"])
 async def register(user: UserCreate):
     """Register a new user and return access token (for mobile apps)"""
     
-    existing_user = await users_collection.find_one({"username": user.username})
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username already exists")
+    await ensure_user_is_new(user)
     
     
-    existing_email = await users_collection.find_one({"email": user.email})
-    if existing_email:
-        raise HTTPException(status_code=400, detail="Email already in use")
-    
-    
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     
     user_dict = {
         "username": user.username,
@@ -924,44 +899,48 @@ async def register(user: UserCreate):
         "bio": ""
     }
     
-    result = await users_collection.insert_one(user_dict)
-    new_user = await users_collection.find_one({"_id": result.inserted_id})
+    await insert_new_user(user_dict)
     
     
+    user_id = str(user_dict["_id"])
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(new_user["_id"])},
+        data={"sub": user_id},
         expires_delta=access_token_expires
     )
     
     
     refresh_token_expires = timedelta(days=30)  
     refresh_token = create_access_token(
-        data={"sub": str(new_user["_id"]), "refresh": True},
+        data={"sub": user_id, "refresh": True},
         expires_delta=refresh_token_expires
     )
     
     
     await users_collection.update_one(
-        {"_id": new_user["_id"]},
-        {"$set": {"refresh_token": get_password_hash(refresh_token)}}
+        {"_id": user_dict["_id"]},
+        {"$set": {"refresh_token": hash_refresh_token(refresh_token)}}
     )
     
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "user_id": str(new_user["_id"]),
-        "username": new_user["username"],
+        "user_id": user_id,
+        "username": user_dict["username"],
         "refresh_token": refresh_token
     }
 
 @app.post("/logout", tags=["auth"])
-async def logout(current_user: dict = Depends(get_current_user)):
+async def logout(
+    current_user: dict = Depends(get_current_user),
+    token: str = Depends(oauth2_scheme)
+):
     """Logout the current user by invalidating their refresh token"""
     await users_collection.update_one(
         {"_id": current_user["_id"]},
         {"$unset": {"refresh_token": ""}}
     )
+    _auth_cache.pop(auth_cache_key(token), None)
     return {"message": "Successfully logged out"}
 
 @app.get("/users/profile", response_model=UserProfile, tags=["users", "auth"])
@@ -972,23 +951,29 @@ async def get_current_user_profile(current_user: dict = Depends(get_current_user
 
 
 @app.post("/users/change-password", tags=["users", "auth"])
-async def change_password(password_data: PasswordChange, current_user: dict = Depends(get_current_user)):
+async def change_password(
+    password_data: PasswordChange,
+    current_user: dict = Depends(get_current_user),
+    token: str = Depends(oauth2_scheme)
+):
     """Change the user's password"""
     
-    if not verify_password(password_data.current_password, current_user["password"]):
+    user = await users_collection.find_one({"_id": current_user["_id"]}, projection={"password": 1})
+    if not await verify_password(password_data.current_password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
     
-    hashed_password = get_password_hash(password_data.new_password)
+    hashed_password = await get_password_hash(password_data.new_password)
     
     
     await users_collection.update_one(
         {"_id": current_user["_id"]},
         {"$set": {"password": hashed_password}}
     )
+    _auth_cache.pop(auth_cache_key(token), None)
     
     return {"message": "Password changed successfully"}
 
@@ -997,17 +982,16 @@ async def change_password(password_data: PasswordChange, current_user: dict = De
 @app.post("/reset-password-request", tags=["auth"])
 async def request_password_reset(reset_request: PasswordResetRequest):
     """Request a password reset code (In a real app, this would send an email)"""
-    user = await get_user_by_email(reset_request.email)
+    user = await get_user_by_email(reset_request.email, projection={"_id": 1})
     if not user:
         
         return {"message": "If the email exists, a reset code has been sent."}
     
     
-    import random
-    reset_code = str(random.randint(100000, 999999))
+    reset_code = secrets.token_urlsafe(24)
     
     
-    expiry = datetime.utcnow() + timedelta(hours=1)
+    expiry = int(time.time()) + RESET_CODE_EXPIRE_SECONDS
     
     
     await users_collection.update_one(
@@ -1033,75 +1017,66 @@ async def request_password_reset(reset_request: PasswordResetRequest):
 @app.post("/reset-password", tags=["auth"])
 async def confirm_password_reset(reset_data: PasswordReset):
     """Confirm a password reset with the code and set a new password"""
-    user = await get_user_by_email(reset_data.email)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid email or reset code"
-        )
-    
-    
-    if "reset_code" not in user or "reset_code_expiry" not in user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No reset code requested or it has expired"
-        )
-    
-    
-    if user["reset_code"] != reset_data.reset_code:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid reset code"
-        )
-    
-    
-    if datetime.utcnow() > user["reset_code_expiry"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Reset code has expired"
-        )
-    
+    reset_filter = {
+        "email": reset_data.email,
+        "reset_code": reset_data.reset_code,
+        "reset_code_expiry": {"$gt": int(time.time())}
+    }
+    invalid_code = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid or expired reset code"
+    )
     
-    hashed_password = get_password_hash(reset_data.new_password)
     
+    if not await users_collection.find_one(reset_filter, projection={"_id": 1}):
+        raise invalid_code
     
-    await users_collection.update_one(
-        {"_id": user["_id"]},
+    hashed_password = await get_password_hash(reset_data.new_password)
+    user = await users_collection.find_one_and_update(
+        reset_filter,
         {
             "$set": {"password": hashed_password},
             "$unset": {"reset_code": "", "reset_code_expiry": ""}
-        }
+        },
+        projection={"_id": 1}
     )
+    if not user:
+        raise invalid_code
     
     return {"message": "Password has been reset successfully"}
 
 
 
-@app.get("/search", tags=["search", "posts"])
-async def search_posts(query: str):
-    """Search for posts by title or content"""
+@app.get("/search", response_model=List[PostResponse], tags=["search", "posts"])
+async def search_posts(query: str, skip: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100)):
+    """Search for posts by title or content, one page at a time"""
     if not query or len(query) < 3:
         raise HTTPException(status_code=400, detail="Search query must be at least 3 characters long")
     
+    page_stages = [
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": _POST_PROJECTION}
+    ]
+    text_match = {"$text": {"$search": query}}
+    text_pipeline = [
+        {"$match": text_match},
+        {"$sort": {"score": {"$meta": "textScore"}}},
+        *page_stages
+    ]
+    prefix = Regex(f"^{re.escape(query)}", "i")
+    prefix_pipeline = [
+        {"$match": {"$or": [{"title": prefix}, {"author": prefix}]}},
+        {"$sort": {"created_at": -1}},
+        *page_stages
+    ]
     
     
-    search_results = []
-    cursor = posts_collection.find({
-        "$or": [
-            {"title": {"$regex": query, "$options": "i"}},
-            {"content": {"$regex": query, "$options": "i"}},
-            {"author": {"$regex": query, "$options": "i"}}
-        ]
-    }).sort("created_at", -1)
-    
-    async for post in cursor:
-        
-        comment_count = await comments_collection.count_documents({"post_id": post["_id"]})
-        post["comments_count"] = comment_count
-        search_results.append(post_helper(post))
+    posts = await posts_collection.aggregate(text_pipeline, batchSize=limit).to_list(length=limit)
+    if not posts and not (skip and await posts_collection.find_one(text_match, projection={"_id": 1})):
+        posts = await posts_collection.aggregate(prefix_pipeline, batchSize=limit).to_list(length=limit)
     
-    return search_results
-
+    return [post_helper(post) for post in posts]
 
 
 
@@ -0,0 +1,41 @@
+"""Gunicorn settings for running the DevIT API in production
+
+Run the data migrations once per release, then launch from the repository root:
+
+    python backend/migrations.py
+    gunicorn -c backend/gunicorn_conf.py backend.api:app
+
+The master also builds the indexes once on startup, before any worker boots,
+since unique votes, users and the text search depend on them.
+
+Each worker opens its own MongoDB pool, holding MONGO_MIN_POOL connections open
+and growing to MONGO_MAX_POOL. Keep WEB_CONCURRENCY * MONGO_MAX_POOL under the
+server's connection limit (500 on Atlas shared tiers, for example).
+"""
+import asyncio
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2 * multiprocessing.cpu_count() + 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+keepalive = 5
+
+
+def on_starting(server):
+    """Build the indexes in the master, logging failures instead of refusing to start"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo.errors import PyMongoError
+    from backend.migrations import create_indexes
+    
+    async def build():
+        client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=5000)
+        try:
+            await create_indexes(client.devit_db)
+        finally:
+            client.close()
+    
+    try:
+        asyncio.run(build())
+    except PyMongoError as e:
+        server.log.error("Could not build MongoDB indexes: %s", e)
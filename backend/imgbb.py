@@ -1,44 +1,94 @@
-import base64
-import requests
+import asyncio
+import httpx
 import logging
+import os
+import time
+from collections import deque
 
 logger = logging.getLogger(__name__)
 
-IMGBB_API_KEYS = [
-]
+IMGBB_API_KEYS = deque(
+    key.strip() for key in os.getenv("IMGBB_KEYS", "").split(",") if key.strip()
+)
 
-def upload_image_to_imgbb(image_bytes: bytes) -> str:
-    """Upload image to imgbb and return URL"""
+# Keys that were rate limited or hit a server error sit out for a while
+KEY_COOLDOWN_SECONDS = 300
+_cooldown = {}
+
+# A slow attempt is hedged with the next key, but never more than two at once
+HEDGE_DELAY_SECONDS = 3
+MAX_CONCURRENT_ATTEMPTS = 2
+
+def _next_keys():
+    """Yield keys round-robin, skipping ones cooling down, and advance the rotation past each key used"""
+    now = time.time()
+    if all(_cooldown.get(key, 0) > now for key in IMGBB_API_KEYS):
+        _cooldown.clear()
     
+    for _ in range(len(IMGBB_API_KEYS)):
+        api_key = IMGBB_API_KEYS[0]
+        IMGBB_API_KEYS.rotate(-1)
+        if _cooldown.get(api_key, 0) <= now:
+            yield api_key
+
+async def _upload_with_key(http_client: httpx.AsyncClient, api_key: str, image_bytes: bytes) -> str:
+    """Upload an image with a single API key and return its URL"""
     try:
-        encoded_image = base64.b64encode(image_bytes).decode("utf-8")
+        logger.info("Attempting upload with API key ending in %s", api_key[-6:])
+        response = await http_client.post(
+            "https://api.imgbb.com/1/upload",
+            data={"key": api_key},
+            files={"image": ("upload.bin", image_bytes)}
+        )
         
         
-        for api_key in IMGBB_API_KEYS:
-            try:
-                logger.info(f"Attempting upload with API key ending in {api_key[-6:]}")
-                response = requests.post(
-                    "https://api.imgbb.com/1/upload",
-                    data={"key": api_key, "image": encoded_image},
-                    timeout=15
-                )
-                
-                
-                logger.info(f"ImgBB response status: {response.status_code}")
+        logger.info("ImgBB response status: %s", response.status_code)
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            _cooldown[api_key] = time.time() + KEY_COOLDOWN_SECONDS
+        
+        data = response.json()
+        if response.status_code == 200 and data.get("success"):
+            return data["data"]["url"]
+        
+        raise Exception(f"ImgBB error response: {data}")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error("ImgBB upload failed with key %s: %s", api_key[-6:], e)
+        raise
+
+async def upload_image_to_imgbb(image_bytes: bytes, http_client: httpx.AsyncClient) -> str:
+    """Upload image to imgbb and return URL"""
+    if not IMGBB_API_KEYS:
+        raise RuntimeError("Image uploads are disabled: set IMGBB_KEYS to at least one ImgBB API key")
+    
+    try:
+        keys = _next_keys()
+        pending = set()
+        try:
+            while True:
+                if len(pending) < MAX_CONCURRENT_ATTEMPTS:
+                    api_key = next(keys, None)
+                    if api_key is not None:
+                        pending.add(asyncio.create_task(_upload_with_key(http_client, api_key, image_bytes)))
+                if not pending:
+                    break
                 
-                data = response.json()
-                if response.status_code == 200 and data.get("success"):
-                    logger.info("Image uploaded successfully")
-                    return data["data"]["url"]
-                else:
-                    logger.error(f"ImgBB error response: {data}")
-            except Exception as e:
-                logger.error(f"ImgBB upload failed with key {api_key[-6:]}: {e}")
-                continue
+                done, pending = await asyncio.wait(
+                    pending, timeout=HEDGE_DELAY_SECONDS, return_when=asyncio.FIRST_COMPLETED
+                )
+                for attempt in done:
+                    if attempt.exception() is None:
+                        logger.info("Image uploaded successfully")
+                        return attempt.result()
+        finally:
+            for attempt in pending:
+                attempt.cancel()
                 
         
         raise Exception("All ImgBB upload attempts failed")
     except Exception as e:
-        logger.error(f"General error in upload_image_to_imgbb: {e}")
+        logger.error("General error in upload_image_to_imgbb: %s", e)
 
         raise Exception(f"Image upload failed: {str(e)}")
@@ -0,0 +1,129 @@
+"""Index builds and one-off data migrations for the DevIT database
+
+Run from the repository root before starting an API version that needs them:
+
+    python backend/migrations.py
+
+Every step is safe to re-run.
+"""
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+load_dotenv()
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+async def create_indexes(database):
+    """Create the indexes used by the API's lookups and sorts, reporting any that fail to build"""
+    indexes = [
+        (database.users, "email", {"unique": True}),
+        (database.users, "username", {"unique": True}),
+        (database.users, "reset_code", {
+            "unique": True,
+            "partialFilterExpression": {"reset_code": {"$exists": True}}
+        }),
+        (database.posts, [("created_at", -1)], {}),
+        (database.posts, [("upvotes", -1), ("created_at", -1)], {}),
+        (database.posts, [("downvotes", -1), ("created_at", -1)], {}),
+        (database.posts, "user_id", {}),
+        (database.posts, [("title", "text"), ("content", "text"), ("author", "text")], {
+            "weights": {"title": 10, "author": 5, "content": 1}
+        }),
+        (database.comments, [("post_id", 1), ("created_at", -1)], {}),
+        (database.votes, [("target_id", 1), ("user_id", 1)], {"unique": True}),
+        (database.votes, "user_id", {})
+    ]
+    results = await asyncio.gather(
+        *(collection.create_index(keys, **options) for collection, keys, options in indexes),
+        return_exceptions=True
+    )
+    
+    for (collection, keys, _), result in zip(indexes, results):
+        if isinstance(result, OperationFailure):
+            # A unique index over existing duplicates fails with E11000; fix the data and re-run
+            print(f"Could not build index {keys} on {collection.name}: {result}")
+        elif isinstance(result, BaseException):
+            raise result
+
+
+async def migrate_embedded_voters(database):
+    """Move voter arrays embedded in posts and comments into the votes collection and recount their votes"""
+    await database.votes.create_index([("target_id", 1), ("user_id", 1)], unique=True)
+    
+    for collection in (database.posts, database.comments):
+        async for document in collection.find({"voters": {"$exists": True}}, projection={"voters": 1}):
+            voters = document["voters"]
+            votes = [
+                {"target_id": document["_id"], "user_id": user_id, "value": 1}
+                for user_id in voters.get("upvoters", [])
+            ] + [
+                {"target_id": document["_id"], "user_id": user_id, "value": -1}
+                for user_id in voters.get("downvoters", [])
+            ]
+            
+            if votes:
+                try:
+                    await database.votes.insert_many(votes, ordered=False)
+                except BulkWriteError as e:
+                    errors = e.details.get("writeErrors", [])
+                    if e.details.get("writeConcernErrors") or any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+                        print(f"Keeping embedded voters on {collection.name} {document['_id']}: {e.details}")
+                        continue
+            
+            # The old $push race could list a voter twice or on both sides, so count what was actually stored
+            counts = {
+                group["_id"]: group["count"]
+                async for group in database.votes.aggregate([
+                    {"$match": {"target_id": document["_id"]}},
+                    {"$group": {"_id": "$value", "count": {"$sum": 1}}}
+                ])
+            }
+            await collection.update_one(
+                {"_id": document["_id"]},
+                {
+                    "$set": {"upvotes": counts.get(1, 0), "downvotes": counts.get(-1, 0)},
+                    "$unset": {"voters": ""}
+                }
+            )
+
+
+async def backfill_comments_count(database):
+    """Recount comments_count on every post from the comments collection
+
+    Counts are overwritten rather than incremented, so posts whose counter was
+    started on write before the backfill still end up correct. Run it while
+    comment writes are stopped, or a comment created mid-run can be missed.
+    """
+    counts = {
+        group["_id"]: group["count"]
+        async for group in database.comments.aggregate([
+            {"$group": {"_id": "$post_id", "count": {"$sum": 1}}}
+        ])
+    }
+    
+    updates = [
+        UpdateOne({"_id": post_id}, {"$set": {"comments_count": counts.get(post_id, 0)}})
+        for post_id in await database.posts.distinct("_id")
+    ]
+    if updates:
+        await database.posts.bulk_write(updates, ordered=False)
+
+
+async def main():
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    try:
+        await create_indexes(client.devit_db)
+        await migrate_embedded_voters(client.devit_db)
+        await backfill_comments_count(client.devit_db)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
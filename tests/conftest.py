@@ -0,0 +1,44 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from argon2 import PasswordHasher
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend import api, migrations
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Point the API's collections at a fresh in-memory database"""
+    database = AsyncMongoMockClient().devit_db
+    for name in ("posts", "comments", "users", "votes"):
+        monkeypatch.setattr(api, f"{name}_collection", getattr(database, name))
+    
+    monkeypatch.setattr(api, "password_hasher", PasswordHasher(time_cost=1, memory_cost=8, parallelism=1))
+    monkeypatch.setattr(api, "_hash_pool", ThreadPoolExecutor(max_workers=2))
+    api._auth_cache.clear()
+    return database
+
+
+@pytest.fixture
+def client(db):
+    with TestClient(api.app) as test_client:
+        test_client.portal.call(migrations.create_indexes, db)
+        yield test_client
+
+
+def register(client, username, email, password="pw123456"):
+    """Register a user and return their auth headers"""
+    response = client.post("/register", json={"username": username, "email": email, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def create_post(client, headers, title="hello world"):
+    response = client.post("/posts", json={"title": title, "content": "some content", "author": "alice"}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
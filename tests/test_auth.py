@@ -0,0 +1,110 @@
+import time
+
+import bcrypt
+
+from backend import api
+from conftest import register
+
+
+def test_register_then_login_by_username_and_email(client):
+    register(client, "alice", "a@x.io")
+    
+    assert client.post("/login", data={"username": "alice", "password": "pw123456"}).status_code == 200
+    assert client.post("/login", data={"username": "a@x.io", "password": "pw123456"}).status_code == 200
+    assert client.post("/login/email", json={"email": "a@x.io", "password": "pw123456"}).status_code == 200
+
+
+def test_login_rejects_wrong_password(client):
+    register(client, "alice", "a@x.io")
+    
+    response = client.post("/login/email", json={"email": "a@x.io", "password": "wrong"})
+    assert response.status_code == 401
+
+
+def test_register_reports_taken_username_before_email(client):
+    register(client, "alice", "a@x.io")
+    register(client, "bob", "b@x.io")
+    
+    response = client.post("/register", json={"username": "bob", "email": "a@x.io", "password": "pw"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already exists"
+    
+    response = client.post("/register", json={"username": "carol", "email": "a@x.io", "password": "pw"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already in use"
+
+
+def test_register_maps_insert_race_to_400(client, monkeypatch):
+    register(client, "alice", "a@x.io")
+    
+    async def no_pre_check(user):
+        pass
+    monkeypatch.setattr(api, "ensure_user_is_new", no_pre_check)
+    
+    response = client.post("/register", json={"username": "alice", "email": "z@x.io", "password": "pw"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already exists"
+    
+    response = client.post("/register", json={"username": "zed", "email": "a@x.io", "password": "pw"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already in use"
+
+
+def test_legacy_bcrypt_hash_logs_in_and_is_upgraded(client, db):
+    password = "a" * 80
+    legacy_hash = bcrypt.hashpw(password.encode()[:72], bcrypt.gensalt(rounds=4)).decode()
+    client.portal.call(db.users.insert_one, {"username": "old", "email": "old@x.io", "password": legacy_hash})
+    
+    response = client.post("/login/email", json={"email": "old@x.io", "password": password})
+    assert response.status_code == 200
+    
+    user = client.portal.call(db.users.find_one, {"username": "old"})
+    assert user["password"].startswith("$argon2")
+    assert client.post("/login/email", json={"email": "old@x.io", "password": password}).status_code == 200
+
+
+def test_logout_evicts_cached_user(client):
+    headers = register(client, "alice", "a@x.io")
+    token = headers["Authorization"].split()[1]
+    
+    assert client.get("/users/profile", headers=headers).status_code == 200
+    assert api.auth_cache_key(token) in api._auth_cache
+    
+    assert client.post("/logout", headers=headers).status_code == 200
+    assert api.auth_cache_key(token) not in api._auth_cache
+
+
+def test_token_without_expiry_is_rejected(client):
+    register(client, "alice", "a@x.io")
+    user_id = client.post("/login/email", json={"email": "a@x.io", "password": "pw123456"}).json()["user_id"]
+    token = api.jwt.encode({"sub": user_id}, api.SECRET_KEY, algorithm=api.ALGORITHM)
+    
+    response = client.get("/users/profile", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+
+def test_reset_code_is_single_use(client):
+    register(client, "alice", "a@x.io")
+    code = client.post("/reset-password-request", json={"email": "a@x.io"}).json()["dev_only"]["reset_code"]
+    
+    response = client.post("/reset-password", json={"email": "a@x.io", "reset_code": "bogus", "new_password": "new"})
+    assert response.status_code == 400
+    
+    response = client.post("/reset-password", json={"email": "a@x.io", "reset_code": code, "new_password": "newpw"})
+    assert response.status_code == 200
+    
+    response = client.post("/reset-password", json={"email": "a@x.io", "reset_code": code, "new_password": "other"})
+    assert response.status_code == 400
+    
+    assert client.post("/login/email", json={"email": "a@x.io", "password": "newpw"}).status_code == 200
+    assert client.post("/login/email", json={"email": "a@x.io", "password": "other"}).status_code == 401
+
+
+def test_reset_rejects_expired_code(client, db):
+    register(client, "alice", "a@x.io")
+    code = client.post("/reset-password-request", json={"email": "a@x.io"}).json()["dev_only"]["reset_code"]
+    client.portal.call(db.users.update_one, {"email": "a@x.io"}, {"$set": {"reset_code_expiry": int(time.time()) - 1}})
+    
+    response = client.post("/reset-password", json={"email": "a@x.io", "reset_code": code, "new_password": "newpw"})
+    assert response.status_code == 400
+    assert client.post("/login/email", json={"email": "a@x.io", "password": "pw123456"}).status_code == 200
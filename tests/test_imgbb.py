@@ -0,0 +1,108 @@
+import asyncio
+import re
+from collections import deque
+
+import httpx
+import pytest
+
+from backend import imgbb
+
+KEYS = ["key-a", "key-b", "key-c"]
+
+
+@pytest.fixture(autouse=True)
+def keys(monkeypatch):
+    """Give every test a fresh key rotation with no cooldowns"""
+    monkeypatch.setattr(imgbb, "IMGBB_API_KEYS", deque(KEYS))
+    monkeypatch.setattr(imgbb, "_cooldown", {})
+    monkeypatch.setattr(imgbb, "HEDGE_DELAY_SECONDS", 0.05)
+
+
+def request_key(request):
+    return re.search(rb'name="key"\r\n\r\n([^\r]+)', request.content).group(1).decode()
+
+
+def success(key):
+    return httpx.Response(200, json={"success": True, "data": {"url": f"https://i.ibb.co/{key}.png"}})
+
+
+def upload(handler):
+    """Upload through a mock ImgBB, returning the URL and the keys used in request order"""
+    used = []
+    
+    async def record(request):
+        used.append(request_key(request))
+        return await handler(request)
+    
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(record)) as http_client:
+            return await imgbb.upload_image_to_imgbb(b"image", http_client)
+    
+    return asyncio.run(run()), used
+
+
+def test_healthy_upload_makes_one_request():
+    async def handler(request):
+        return success(request_key(request))
+    
+    url, used = upload(handler)
+    assert url == "https://i.ibb.co/key-a.png"
+    assert used == ["key-a"]
+
+
+def test_failing_key_moves_on_to_the_next():
+    async def handler(request):
+        if request_key(request) == "key-a":
+            return httpx.Response(400, json={"success": False, "error": {"message": "Invalid API v1 key."}})
+        return success(request_key(request))
+    
+    url, used = upload(handler)
+    assert url == "https://i.ibb.co/key-b.png"
+    assert used == ["key-a", "key-b"]
+
+
+def test_stalled_key_is_hedged_with_at_most_two_in_flight():
+    in_flight = []
+    peak = []
+    
+    async def handler(request):
+        in_flight.append(request)
+        peak.append(len(in_flight))
+        try:
+            if request_key(request) != "key-c":
+                await asyncio.sleep(0.2)
+                return httpx.Response(503, json={"success": False})
+            return success("key-c")
+        finally:
+            in_flight.remove(request)
+    
+    url, used = upload(handler)
+    assert url == "https://i.ibb.co/key-c.png"
+    assert used == KEYS
+    assert max(peak) == imgbb.MAX_CONCURRENT_ATTEMPTS
+
+
+@pytest.mark.parametrize("status_code", [429, 500, 503])
+def test_rate_limited_or_failing_key_cools_down(status_code):
+    async def handler(request):
+        if request_key(request) == "key-a":
+            return httpx.Response(status_code, json={"success": False})
+        return success(request_key(request))
+    
+    upload(handler)
+    assert "key-a" in imgbb._cooldown
+    
+    # The rotation comes back round to key-a, which is still cooling down
+    _, used = upload(handler)
+    _, used_again = upload(handler)
+    assert "key-a" not in used + used_again
+
+
+def test_no_keys_configured_raises(monkeypatch):
+    monkeypatch.setattr(imgbb, "IMGBB_API_KEYS", deque())
+    
+    async def handler(request):
+        return success(request_key(request))
+    
+    with pytest.raises(RuntimeError, match="IMGBB_KEYS"):
+        upload(handler)
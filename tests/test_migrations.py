@@ -0,0 +1,93 @@
+import asyncio
+from types import SimpleNamespace
+
+from mongomock_motor import AsyncMongoMockClient
+
+from backend import migrations
+
+
+class BulkWritePosts:
+    """Posts collection stand-in that applies bulk UpdateOnes one by one, which mongomock cannot run under current pymongo"""
+    
+    def __init__(self, collection):
+        self._collection = collection
+    
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+    
+    async def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            await self._collection.update_one(request._filter, request._doc)
+
+
+def test_create_indexes_reports_duplicates_and_builds_the_rest(capsys):
+    database = AsyncMongoMockClient().devit_db
+    
+    async def migrate():
+        await database.users.insert_many([
+            {"username": "alice", "email": "same@x.io"},
+            {"username": "bob", "email": "same@x.io"}
+        ])
+        await migrations.create_indexes(database)
+        return await database.users.index_information()
+    
+    indexes = asyncio.run(migrate())
+    
+    assert "Could not build index email on users" in capsys.readouterr().out
+    assert "email_1" not in indexes
+    assert "username_1" in indexes
+
+
+def test_backfill_recounts_posts_whose_counter_started_on_write():
+    database = AsyncMongoMockClient().devit_db
+    
+    async def migrate():
+        legacy, empty, counted = await asyncio.gather(*(
+            database.posts.insert_one(post)
+            for post in ({"title": "legacy"}, {"title": "empty"}, {"title": "counted", "comments_count": 1})
+        ))
+        await database.comments.insert_many(
+            [{"post_id": legacy.inserted_id} for _ in range(6)] + [{"post_id": counted.inserted_id}]
+        )
+        # A comment created before the backfill started the legacy post's counter at 1
+        await database.posts.update_one({"_id": legacy.inserted_id}, {"$inc": {"comments_count": 1}})
+        
+        migrating = SimpleNamespace(posts=BulkWritePosts(database.posts), comments=database.comments)
+        await migrations.backfill_comments_count(migrating)
+        await migrations.backfill_comments_count(migrating)
+        return {post["title"]: post["comments_count"] async for post in database.posts.find()}
+    
+    assert asyncio.run(migrate()) == {"legacy": 6, "empty": 0, "counted": 1}
+
+
+def test_voter_migration_recounts_votes_from_what_was_stored():
+    database = AsyncMongoMockClient().devit_db
+    
+    async def migrate():
+        post = await database.posts.insert_one({
+            "title": "raced",
+            "upvotes": 2,
+            "downvotes": 1,
+            "voters": {"upvoters": ["u1", "u2"], "downvoters": ["u2"]}
+        })
+        comment = await database.comments.insert_one({
+            "text": "doubled",
+            "upvotes": 2,
+            "downvotes": 0,
+            "voters": {"upvoters": ["u1", "u1"], "downvoters": []}
+        })
+        
+        await migrations.migrate_embedded_voters(database)
+        await migrations.migrate_embedded_voters(database)
+        return (
+            await database.posts.find_one({"_id": post.inserted_id}),
+            await database.comments.find_one({"_id": comment.inserted_id}),
+            await database.votes.find(projection={"_id": 0, "user_id": 1, "value": 1}).to_list(length=None)
+        )
+    
+    post, comment, votes = asyncio.run(migrate())
+    
+    assert "voters" not in post and "voters" not in comment
+    assert (post["upvotes"], post["downvotes"]) == (2, 0)
+    assert (comment["upvotes"], comment["downvotes"]) == (1, 0)
+    assert sorted((vote["user_id"], vote["value"]) for vote in votes) == [("u1", 1), ("u1", 1), ("u2", 1)]
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from conftest import create_post, register
+
+
+def test_creating_comments_increments_post_count(client, db):
+    headers = register(client, "alice", "a@x.io")
+    post_id = create_post(client, headers)["id"]
+    
+    for text in ("first", "second"):
+        response = client.post("/comments", json={"post_id": post_id, "text": text, "username": "alice"})
+        assert response.status_code == 200
+    # Stored datetimes keep only milliseconds, so keep the two comments from tying on created_at
+    client.portal.call(db.comments.update_one, {"text": "first"}, {"$set": {"created_at": datetime(2000, 1, 1)}})
+    
+    assert client.get(f"/posts/{post_id}").json()["comments_count"] == 2
+    assert [c["text"] for c in client.get(f"/posts/{post_id}/comments").json()] == ["second", "first"]
+
+
+def test_comment_on_missing_post_is_rejected(client):
+    response = client.post("/comments", json={"post_id": str(ObjectId()), "text": "hi", "username": "alice"})
+    assert response.status_code == 404
+
+
+def test_list_posts_pages_and_sorts(client):
+    headers = register(client, "alice", "a@x.io")
+    ids = [create_post(client, headers, title=f"post {n}")["id"] for n in range(3)]
+    client.post(f"/posts/{ids[0]}/vote", json={"vote_type": "upvote"}, headers=headers)
+    
+    assert len(client.get("/posts", params={"limit": 2}).json()) == 2
+    assert client.get("/posts", params={"sort": "most_upvoted", "limit": 1}).json()[0]["id"] == ids[0]
+
+
+def test_delete_post_removes_comments_and_votes(client, db):
+    headers = register(client, "alice", "a@x.io")
+    post_id = create_post(client, headers)["id"]
+    comment_id = client.post("/comments", json={"post_id": post_id, "text": "hi", "username": "alice"}).json()["id"]
+    client.post(f"/posts/{post_id}/vote", json={"vote_type": "upvote"}, headers=headers)
+    client.post(f"/comments/{comment_id}/vote", json={"vote_type": "upvote"}, headers=headers)
+    
+    assert client.delete(f"/posts/{post_id}", headers=headers).status_code == 200
+    assert client.portal.call(db.comments.count_documents, {}) == 0
+    assert client.portal.call(db.votes.count_documents, {}) == 0
+
+
+def test_only_author_can_delete_post(client):
+    alice = register(client, "alice", "a@x.io")
+    bob = register(client, "bob", "b@x.io")
+    post_id = create_post(client, alice)["id"]
+    
+    assert client.delete(f"/posts/{post_id}", headers=bob).status_code == 403
+    assert client.get(f"/posts/{post_id}").status_code == 200
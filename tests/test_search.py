@@ -0,0 +1,74 @@
+import pytest
+
+from backend import api
+from conftest import create_post, register
+
+
+class TextSearchPosts:
+    """Posts collection stand-in that answers $text queries, which mongomock lacks"""
+    
+    def __init__(self, collection, text_hits):
+        self._collection = collection
+        self.text_hits = text_hits
+        self.pipelines = []
+    
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+    
+    def aggregate(self, pipeline, **kwargs):
+        self.pipelines.append(pipeline)
+        if "$text" in pipeline[0]["$match"]:
+            return self._collection.aggregate([{"$match": {"_id": {"$in": self.text_hits}}}, *pipeline[2:]], **kwargs)
+        return self._collection.aggregate(pipeline, **kwargs)
+    
+    async def find_one(self, filter=None, *args, **kwargs):
+        if filter and "$text" in filter:
+            return {"_id": self.text_hits[0]} if self.text_hits else None
+        return await self._collection.find_one(filter, *args, **kwargs)
+
+
+@pytest.fixture
+def search_posts(client, db, monkeypatch):
+    headers = register(client, "alice", "a@x.io")
+    for title in ("python tips", "python tricks", "rust notes"):
+        create_post(client, headers, title=title)
+    
+    posts = TextSearchPosts(db.posts, [])
+    monkeypatch.setattr(api, "posts_collection", posts)
+    return posts
+
+
+def titles(response):
+    assert response.status_code == 200, response.text
+    return sorted(post["title"] for post in response.json())
+
+
+def test_text_hits_skip_prefix_fallback(client, db, search_posts):
+    search_posts.text_hits = client.portal.call(db.posts.distinct, "_id", {"title": "rust notes"})
+    
+    assert titles(client.get("/search", params={"query": "notes"})) == ["rust notes"]
+    assert len(search_posts.pipelines) == 1
+
+
+def test_prefix_fallback_when_no_text_hits(client, search_posts):
+    assert titles(client.get("/search", params={"query": "pyth"})) == ["python tips", "python tricks"]
+    assert titles(client.get("/search", params={"query": "ALI"})) == ["python tips", "python tricks", "rust notes"]
+    assert len(search_posts.pipelines) == 4
+
+
+def test_prefix_fallback_escapes_query(client, search_posts):
+    assert titles(client.get("/search", params={"query": "py.hon"})) == []
+
+
+def test_no_prefix_fallback_past_last_text_page(client, db, search_posts):
+    search_posts.text_hits = client.portal.call(db.posts.distinct, "_id", {"title": "python tips"})
+    
+    assert titles(client.get("/search", params={"query": "python", "skip": 5})) == []
+    assert len(search_posts.pipelines) == 1
+
+
+def test_search_rejects_bad_paging_and_short_queries(client, search_posts):
+    assert client.get("/search", params={"query": "py"}).status_code == 400
+    assert client.get("/search", params={"query": "python", "skip": -1}).status_code == 422
+    assert client.get("/search", params={"query": "python", "limit": 0}).status_code == 422
+    assert client.get("/search", params={"query": "python", "limit": 101}).status_code == 422
@@ -0,0 +1,137 @@
+import pytest
+from bson import ObjectId
+
+from backend import api
+from conftest import create_post, register
+
+
+# (current vote, request) -> (stored vote, upvotes, downvotes), or the no-op message
+EXPECTED = {
+    (0, "upvote"): (1, 1, 0),
+    (0, "downvote"): (-1, 0, 1),
+    (0, "remove_upvote"): "Not upvoted",
+    (0, "remove_downvote"): "Not downvoted",
+    (1, "upvote"): "Already upvoted",
+    (1, "downvote"): (-1, 0, 1),
+    (1, "remove_upvote"): (0, 0, 0),
+    (1, "remove_downvote"): "Not downvoted",
+    (-1, "upvote"): (1, 1, 0),
+    (-1, "downvote"): "Already downvoted",
+    (-1, "remove_upvote"): "Not upvoted",
+    (-1, "remove_downvote"): (0, 0, 0),
+}
+
+
+def user_id(client, headers):
+    return client.get("/users/profile", headers=headers).json()["id"]
+
+
+def stored_vote(client, db, target_id, voter_id):
+    vote = client.portal.call(db.votes.find_one, {"target_id": ObjectId(target_id), "user_id": voter_id})
+    return vote["value"] if vote else 0
+
+
+@pytest.mark.parametrize("current, vote_type", sorted(EXPECTED))
+def test_vote_transitions(client, db, current, vote_type):
+    headers = register(client, "alice", "a@x.io")
+    voter_id = user_id(client, headers)
+    post_id = create_post(client, headers)["id"]
+    if current:
+        client.portal.call(db.votes.insert_one, {"target_id": ObjectId(post_id), "user_id": voter_id, "value": current})
+        client.portal.call(db.posts.update_one, {"_id": ObjectId(post_id)}, {"$set": {"upvotes": int(current == 1), "downvotes": int(current == -1)}})
+    
+    response = client.post(f"/posts/{post_id}/vote", json={"vote_type": vote_type}, headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    expected = EXPECTED[(current, vote_type)]
+    
+    if isinstance(expected, str):
+        assert body["message"] == expected
+        assert body["action"] == "none"
+        assert stored_vote(client, db, post_id, voter_id) == current
+    else:
+        value, upvotes, downvotes = expected
+        assert (body["upvotes"], body["downvotes"]) == (upvotes, downvotes)
+        assert stored_vote(client, db, post_id, voter_id) == value
+
+
+def test_transition_table_matches_expected_moves():
+    moves = {key: value for key, value in EXPECTED.items() if not isinstance(value, str)}
+    assert set(api._VOTE_TRANSITIONS) == set(moves)
+    for (current, vote_type), (_, upvotes, downvotes) in moves.items():
+        increment = api._VOTE_TRANSITIONS[(current, vote_type)]
+        assert increment.get("upvotes", 0) == upvotes - (current == 1)
+        assert increment.get("downvotes", 0) == downvotes - (current == -1)
+
+
+def test_vote_rejects_unknown_type_and_missing_post(client):
+    headers = register(client, "alice", "a@x.io")
+    post_id = create_post(client, headers)["id"]
+    
+    response = client.post(f"/posts/{post_id}/vote", json={"vote_type": "sideways"}, headers=headers)
+    assert response.status_code == 400
+    
+    response = client.post(f"/posts/{ObjectId()}/vote", json={"vote_type": "upvote"}, headers=headers)
+    assert response.status_code == 404
+
+
+def test_votes_are_per_user(client):
+    alice = register(client, "alice", "a@x.io")
+    bob = register(client, "bob", "b@x.io")
+    post_id = create_post(client, alice)["id"]
+    
+    client.post(f"/posts/{post_id}/vote", json={"vote_type": "upvote"}, headers=alice)
+    response = client.post(f"/posts/{post_id}/vote", json={"vote_type": "downvote"}, headers=bob)
+    assert (response.json()["upvotes"], response.json()["downvotes"]) == (1, 1)
+
+
+def test_comment_vote(client):
+    headers = register(client, "alice", "a@x.io")
+    post_id = create_post(client, headers)["id"]
+    comment_id = client.post("/comments", json={"post_id": post_id, "text": "hi", "username": "alice"}).json()["id"]
+    
+    response = client.post(f"/comments/{comment_id}/vote", json={"vote_type": "upvote"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["upvotes"] == 1
+    
+    response = client.post(f"/comments/{comment_id}/vote", json={"vote_type": "upvote"}, headers=headers)
+    assert response.json()["message"] == "Already upvoted"
+    assert response.json()["upvotes"] == 1
+
+
+class CountingCollection:
+    """Collection stand-in that records each Mongo call made through it"""
+    
+    def __init__(self, collection, calls):
+        self._collection = collection
+        self._calls = calls
+    
+    def __getattr__(self, name):
+        self._calls.append(f"{self._collection.name}.{name}")
+        return getattr(self._collection, name)
+
+
+@pytest.mark.parametrize("vote_type", ["upvote", "remove_upvote"])
+def test_vote_takes_two_round_trips(client, db, monkeypatch, vote_type):
+    headers = register(client, "alice", "a@x.io")
+    post_id = create_post(client, headers)["id"]
+    if vote_type == "remove_upvote":
+        client.post(f"/posts/{post_id}/vote", json={"vote_type": "upvote"}, headers=headers)
+    
+    calls = []
+    monkeypatch.setattr(api, "posts_collection", CountingCollection(db.posts, calls))
+    monkeypatch.setattr(api, "votes_collection", CountingCollection(db.votes, calls))
+    
+    response = client.post(f"/posts/{post_id}/vote", json={"vote_type": vote_type}, headers=headers)
+    assert response.status_code == 200
+    assert len(calls) == 2, calls
+
+
+def test_vote_on_missing_post_leaves_no_vote(client, db):
+    headers = register(client, "alice", "a@x.io")
+    missing_id = ObjectId()
+    
+    for vote_type in ("upvote", "upvote", "remove_upvote"):
+        response = client.post(f"/posts/{missing_id}/vote", json={"vote_type": vote_type}, headers=headers)
+        assert response.status_code == 404
+    assert client.portal.call(db.votes.count_documents, {}) == 0